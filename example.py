@@ -10,7 +10,19 @@ def main():
 
   pud = war2pud.model.PUD()
 
-  for section_name, data in reader.readsections():
+  # Read the file once; the player table is built from the raw sections and only the sections
+  # used below are parsed.
+  sections = list(reader.readrawsections())
+
+  players = war2pud.model.PlayerTable.fromsections(sections)
+  pud.players = players.toplayers(reader)
+
+  for section_name, raw in sections:
+    if not section_name in ('TYPE', 'DESC', 'DIM ', 'VER ', 'UNIT', 'ERA ', 'MTXM'):
+      continue
+
+    data = reader._parsesection(section_name, raw, len(raw))
+
     if section_name == 'TYPE':
       pud.type = data['type']
       pud.id   = data['id']
@@ -24,30 +36,6 @@ def main():
     elif section_name == 'VER ':
       pud.version = data
 
-    elif section_name == 'OWNR':
-      for index, type in enumerate(data):
-        pud.players[index].type = reader._allowedplayertypes[type]
-
-    elif section_name == 'SIDE':
-      for index, race in enumerate(data):
-        pud.players[index].race = reader._allowedraces[race]['name']
-
-    elif section_name == 'AIPL':
-      for index, ai in enumerate(data):
-        pud.players[index].ai = reader._allowedai[ai]['name']
-
-    elif section_name == 'SGLD':
-      for index, gold in enumerate(data):
-        pud.players[index].gold = gold
-
-    elif section_name == 'SLBR':
-      for index, lumber in enumerate(data):
-        pud.players[index].lumber = lumber
-
-    elif section_name == 'SOIL':
-      for index, oil in enumerate(data):
-        pud.players[index].oil = oil
-
     elif section_name == 'UNIT':
       pud.units = data
 
@@ -55,13 +43,7 @@ def main():
       pud.terrain = reader._terrains[data]['name']
 
     elif section_name == 'MTXM':
-      tiles = numpy.zeros((pud.width, pud.height))
-
-      for h in range(pud.height):
-        for w in range(pud.width):
-          tiles[w, h] = data[w * h]
-
-      pud.tiles = tiles
+      pud.tiles = numpy.array(data, dtype=numpy.uint16).reshape(pud.height, pud.width)
 
   print 'Type:', pud.type
   print 'ID:', hex(pud.id)
@@ -69,7 +51,8 @@ def main():
   print 'Size:', pud.width, 'x', pud.height
   print 'Description:', pud.description
   print 'Terrain:', pud.terrain
-  print 'Players:', sum([1 for p in pud.players if p.type != 'unused' and p.race != 'neutral'])
+  print 'Players:', numpy.count_nonzero((players['type'] != war2pud.model.PlayerType.UNUSED) &
+                                        (players.names('race', reader) != 'neutral'))
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
@@ -1,5 +1,8 @@
 # Standard Python imports.
 import os
+import shutil
+import StringIO
+import tempfile
 import sys
 import unittest
 
@@ -12,6 +15,10 @@ sys.path.append(parentdir)
 # Application imports.
 import war2pud
 
+# 3rd party imports.
+import Image
+import numpy
+
 class TestAssetFunctions(unittest.TestCase):
 
   def setUp(self):
@@ -27,7 +34,317 @@ class TestAssetFunctions(unittest.TestCase):
   def test_loadassets(self):
     self.assertTrue(self.reader.loadassets(datadir))
 
+class TestDiffFunctions(unittest.TestCase):
+
+  def setUp(self):
+    tiles = numpy.arange(16, dtype='<u2')
+    units = numpy.array([(1, 1, 0x5c, 15, 2500), (2, 3, 0x5e, 0, 0)], dtype=war2pud.diff.UNIT_DTYPE)
+
+    self.old = [('DIM ', '\x04\x00\x04\x00'),
+                ('MTXM', tiles.tobytes()),
+                ('UNIT', units.tobytes()),
+                ('SIGN', '\x00' * 4)]
+
+    tiles[5] = 0x1234
+    units[1]['x'] = 3
+    units = numpy.append(units, numpy.array([(0, 0, 0x5d, 15, 1000)], dtype=units.dtype))
+
+    self.new = [('DIM ', '\x04\x00\x04\x00'),
+                ('MTXM', tiles.tobytes()),
+                ('UNIT', units.tobytes()),
+                ('SGLD', '\x00' * 32)]
+
+  def test_diff(self):
+    patch = war2pud.diff.diff(self.old, self.new)
+
+    self.assertEqual(sorted(s.name for s in patch), ['MTXM', 'SGLD', 'SIGN', 'UNIT'])
+    self.assertEqual(list(patch['MTXM'].indices), [5])
+    self.assertEqual(list(patch['MTXM'].values), [0x1234])
+    self.assertEqual(patch['SGLD'].op, war2pud.diff.SectionPatch.ADD)
+    self.assertEqual(patch['SIGN'].op, war2pud.diff.SectionPatch.REMOVE)
+
+  def test_apply(self):
+    patch = war2pud.diff.diff(self.old, self.new)
+    self.assertEqual(list(patch.apply(self.old).items()), self.new)
+
+  def test_apply_mismatch(self):
+    patch = war2pud.diff.diff(self.old, self.new)
+    old = dict(self.old, MTXM='\x00\x00')
+    self.assertRaises(war2pud.exception.PatchError, patch.apply, old)
+
+  def test_units(self):
+    patch   = war2pud.diff.diff(self.old, self.new)
+    changes = patch['UNIT'].units(dict(self.old)['UNIT'])
+
+    self.assertEqual(list(changes['moved']['x']), [3])
+    self.assertEqual(list(changes['added']['type']), [0x5d])
+    self.assertEqual(len(changes['removed']), 0)
+
+  def test_diff_units_compact(self):
+    units = numpy.zeros(50, dtype=war2pud.diff.UNIT_DTYPE)
+    units['x'] = numpy.arange(50)
+    old, new = units.tobytes(), units[1:].tobytes()
+
+    patch = war2pud.diff.diff([('UNIT', old)], [('UNIT', new)])['UNIT']
+
+    self.assertEqual(list(patch.removed), [0])
+    self.assertEqual(len(patch.indices), 0)
+    self.assertEqual(patch.apply(old), new)
+
+  def test_diff_units_reorder(self):
+    units = numpy.zeros(6, dtype=war2pud.diff.UNIT_DTYPE)
+    units['x'] = numpy.arange(6)
+    old = units.tobytes()
+    new = units[[5, 0, 1, 2, 3, 4]].tobytes()
+
+    patch = war2pud.diff.diff([('UNIT', old)], [('UNIT', new)])['UNIT']
+
+    self.assertEqual(len(patch.indices), 1)
+    self.assertEqual(patch.apply(old), new)
+
+  def test_diff_index_type(self):
+    tiles = numpy.zeros(128 * 128, dtype='<u2')
+    old = tiles.tobytes()
+    tiles[-1] = 1
+
+    patch = war2pud.diff.diff([('MTXM', old)], [('MTXM', tiles.tobytes())])['MTXM']
+
+    self.assertEqual(patch.indices.dtype, numpy.uint16)
+
+  def test_apply_other_revision(self):
+    patch = war2pud.diff.diff(self.old, self.new)
+    old = dict(self.old, MTXM=numpy.full(16, 7, dtype='<u2').tobytes())
+    self.assertRaises(war2pud.exception.PatchError, patch.apply, old)
+
+  def unitchanges(self, old, new):
+    old = numpy.array(old, dtype=war2pud.diff.UNIT_DTYPE).tobytes()
+    new = numpy.array(new, dtype=war2pud.diff.UNIT_DTYPE).tobytes()
+    return war2pud.diff.diff([('UNIT', old)], [('UNIT', new)])['UNIT'].units(old)
+
+  def test_units_delete(self):
+    units   = [(1, 1, 0x5c, 15, 10), (5, 5, 0x02, 0, 0), (6, 6, 0x02, 0, 0), (9, 9, 0x5d, 15, 4)]
+    changes = self.unitchanges(units, units[1:])
+
+    self.assertEqual(changes['removed'].tolist(), [(1, 1, 0x5c, 15, 10)])
+    self.assertEqual(len(changes['added']), 0)
+    self.assertEqual(len(changes['moved']), 0)
+    self.assertEqual(len(changes['changed']), 0)
+
+  def test_units_resource(self):
+    changes = self.unitchanges([(1, 1, 0x5c, 15, 10), (5, 5, 0x02, 0, 0)],
+                               [(1, 1, 0x5c, 15, 20), (5, 5, 0x02, 0, 0)])
+
+    self.assertEqual(changes['changed'].tolist(), [(1, 1, 0x5c, 15, 20)])
+    self.assertEqual(len(changes['moved']), 0)
+    self.assertEqual(len(changes['added']) + len(changes['removed']), 0)
+
+class TestExportFunctions(unittest.TestCase):
+
+  def setUp(self):
+    self.pud = war2pud.model.PUD()
+    self.pud.width, self.pud.height = 3, 2
+    self.pud.terrain = 'forest'
+    self.pud.tiles = numpy.array([[0x0010, 0x0050, 0x0070],
+                                  [0x0081, 0x0213, 0x0094]], dtype=numpy.uint16)
+
+  def export(self, format, stream):
+    f = StringIO.StringIO()
+    self.pud.export(f, format, stream)
+    f.seek(0)
+    return numpy.asarray(Image.open(f).convert('RGB'))
+
+  def test_export_stream(self):
+    expected = self.export('png', False)
+
+    self.assertEqual(expected.shape, (64, 96, 3))
+    self.assertTrue((self.export('png', True) == expected).all())
+    self.assertTrue((self.export('bmp', True) == expected).all())
+
+  def test_export_filename(self):
+    directory = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(directory, 'map.jpg')
+      self.pud.export(filename)
+      self.assertEqual(Image.open(filename).format, 'JPEG')
+    finally:
+      shutil.rmtree(directory)
+
+  def test_export_stream_format(self):
+    self.assertRaises(war2pud.exception.ExportError, self.pud.export, StringIO.StringIO(), 'gif',
+                      True)
+
+class TestPlayerTableFunctions(unittest.TestCase):
+
+  def setUp(self):
+    self.reader = war2pud.PUDFileReader()
+    self.reader.loadassets(datadir)
+
+    owners = numpy.array([5, 5, 4] + [3] * 13, dtype='u1')
+    gold   = numpy.array([1000, 5000, 1000] + [0] * 13, dtype='<u2')
+
+    self.tables = []
+    for mapid in range(2):
+      sections = [('OWNR', owners.tobytes()),
+                  ('SIDE', numpy.ones(16, dtype='u1').tobytes()),
+                  ('SGLD', gold.tobytes())]
+      self.tables.append(war2pud.model.PlayerTable.fromsections(sections, mapid))
+      gold[0] = 3000
+
+  def test_fromsections(self):
+    table = self.tables[0]
+
+    self.assertEqual(len(table), 16)
+    self.assertEqual(list(table['gold'][:3]), [1000, 5000, 1000])
+    self.assertEqual(list(table['type'][:3]), [5, 5, 4])
+
+  def test_maps(self):
+    table = war2pud.model.PlayerTable.concatenate(self.tables)
+    human = table['type'] == war2pud.model.PlayerType.HUMAN
+
+    self.assertEqual(list(table.maps(human & (table['gold'] < 2000))), [0])
+    self.assertEqual(list(table.maps()), [0, 1])
+
+  def test_computers(self):
+    table = self.tables[0]
+    table.records['type'][3] = war2pud.model.PlayerType.COMPUTER_1
+
+    computers = numpy.in1d(table['type'], war2pud.model.PlayerType.COMPUTERS)
+    self.assertEqual(list(table['slot'][computers]), [2, 3])
+
+  def test_names(self):
+    table = self.tables[0]
+
+    self.assertEqual(table.names('type', self.reader)[0], 'human')
+    self.assertEqual(table.names('race', self.reader)[0], 'orc')
+    self.assertEqual(table.toplayers(self.reader)[1].gold, 5000)
+
+class TestSymmetryFunctions(unittest.TestCase):
+
+  def setUp(self):
+    self.tiles = numpy.full((8, 8), 0x0050, dtype=numpy.uint16)
+    self.tiles[:, :2] = 0x0010
+    self.tiles[:, 6:] = 0x0013
+    self.tiles[0, 3] = 0x0070
+
+    # Two start locations with a gold mine each, mirrored left to right.
+    self.units = numpy.array([(1, 4, 0x5e, 0, 0),
+                              (6, 4, 0x5f, 1, 0),
+                              (0, 0, 0x5c, 15, 10),
+                              (5, 0, 0x5c, 15, 10),
+                              (7, 7, 0x5d, 15, 4)], dtype=war2pud.diff.UNIT_DTYPE)
+
+  def test_tilesymmetry(self):
+    scores = war2pud.symmetry.tilesymmetry(self.tiles)
+
+    self.assertEqual(scores['horizontal'], 62 / 64.0)
+    self.assertEqual(scores['vertical'], 62 / 64.0)
+    self.assertEqual(scores['rotate180'], 62 / 64.0)
+    self.assertEqual(war2pud.symmetry.tilesymmetry(self.tiles[:4])['rotate90'], None)
+
+  def test_tilesymmetry_boundary(self):
+    # Water, a coast/grass edge, grass, the mirrored edge and water again.
+    tiles = numpy.array([[0x0010, 0x0530, 0x0050, 0x05c2, 0x0013]] * 2, dtype=numpy.uint16)
+
+    self.assertEqual(war2pud.symmetry.tilesymmetry(tiles)['horizontal'], 1.0)
+
+  def test_unitsymmetry(self):
+    scores = war2pud.symmetry.unitsymmetry(self.units, 8, 8, tolerance=2)
+
+    self.assertEqual(scores['horizontal'], 0.8)
+
+  def test_resourceaccess(self):
+    access = war2pud.symmetry.resourceaccess(self.units, radius=5)
+
+    self.assertEqual(list(access['player']), [0, 1])
+    self.assertEqual(list(access['gold']), [10, 10])
+    self.assertEqual(list(access['oil']), [0, 4])
+    self.assertEqual(war2pud.symmetry.fairness(access)['oil'], 0.0)
+    self.assertEqual(war2pud.symmetry.fairness(access)['gold'], 1.0)
+
+class TestCorpusFunctions(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+    small = numpy.array([[0x10, 0x50], [0x50, 0x70]], dtype='<u2')
+    large = numpy.full((3, 4), 0x50, dtype='<u2')
+
+    self.maps = [('small.pud', [('DIM ', '\x02\x00\x02\x00'),
+                                ('ERA ', '\x01\x00'),
+                                ('MTXM', small.tobytes())]),
+                 ('large.pud', [('DIM ', '\x04\x00\x03\x00'),
+                                ('ERA ', '\x00\x00'),
+                                ('MTXM', large.tobytes())])]
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_pack(self):
+    corpus = war2pud.corpus.pack(self.directory, self.maps)
+
+    self.assertEqual(corpus['MTXM'].shape, (2, 128, 128))
+    self.assertEqual(list(corpus.index['id']), ['small.pud', 'large.pud'])
+    self.assertEqual(corpus['MTXM'][0, 1, 1], 0x70)
+    self.assertEqual(corpus['MTXM'][1, 3, 0], 0)
+    self.assertEqual(int(corpus.valid([0, 1]).sum()), 4 + 12)
+    self.assertEqual(int(corpus.valid([1]).sum()), 12)
+    self.assertEqual(corpus.valid(0).shape, (1, 128, 128))
+
+  def test_tilecounts(self):
+    corpus = war2pud.corpus.pack(self.directory, self.maps)
+    winter = corpus.index['terrain'] == 1
+
+    self.assertEqual(corpus.tilecounts()[0x50], 2 + 12)
+    self.assertEqual(corpus.tilecounts(maps=winter)[0x50], 2)
+
+  def test_pack_long_id(self):
+    maps = [('x' * 300, self.maps[0][1])] + self.maps[1:]
+    corpus = war2pud.corpus.pack(self.directory, maps)
+
+    self.assertEqual(corpus.index['id'][0], 'x' * 300)
+
+  def test_pack_unknown_layer(self):
+    self.assertRaises(war2pud.exception.SectionError, war2pud.corpus.pack, self.directory,
+                      self.maps, ('MTXM', 'OILM'))
+
+  def test_pack_missing_layer(self):
+    self.assertRaises(war2pud.exception.SectionError, war2pud.corpus.pack, self.directory,
+                      self.maps, ('MTXM', 'SQM '))
+
+class TestTilesetFunctions(unittest.TestCase):
+
+  def setUp(self):
+    self.tileset = war2pud.tileset.load('winter', datadir)
+    self.tiles = numpy.array([[0x0010, 0x0053, 0x0070],
+                              [0x0213, 0x0094, 0xffff]], dtype=numpy.uint16)
+
+  def test_load(self):
+    self.assertTrue(war2pud.tileset.load('winter', datadir) is self.tileset)
+    self.assertEqual(self.tileset.classes.shape, (0x10000,))
+
+  def test_classify(self):
+    TileClass = war2pud.tileset.TileClass
+
+    self.assertEqual(self.tileset.classify(self.tiles).tolist(),
+                     [[TileClass.LIGHT_WATER, TileClass.LIGHT_GROUND, TileClass.FOREST],
+                      [TileClass.WATER_COAST, TileClass.HUMAN_WALL, TileClass.UNKNOWN]])
+
+  def test_minimap(self):
+    minimap = self.tileset.minimap(self.tiles)
+    indices = self.tileset.atlasindices(self.tiles)
+    expected = self.tileset.tiles[indices[1, 0]].mean(axis=(0, 1)).round()
+
+    self.assertEqual(minimap.shape, (2, 3, 3))
+    self.assertTrue((minimap[1, 0] == expected).all())
+
 if __name__ == '__main__':
   #unittest.main()
-  suite = unittest.TestLoader().loadTestsFromTestCase(TestAssetFunctions)
+  loader = unittest.TestLoader()
+  suite  = unittest.TestSuite([loader.loadTestsFromTestCase(TestAssetFunctions),
+                               loader.loadTestsFromTestCase(TestDiffFunctions),
+                               loader.loadTestsFromTestCase(TestExportFunctions),
+                               loader.loadTestsFromTestCase(TestPlayerTableFunctions),
+                               loader.loadTestsFromTestCase(TestSymmetryFunctions),
+                               loader.loadTestsFromTestCase(TestCorpusFunctions),
+                               loader.loadTestsFromTestCase(TestTilesetFunctions)])
   unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file
@@ -21,6 +21,11 @@ import const
 import exception
 import util
 import model
+import diff
+import render
+import symmetry
+import corpus
+import tileset
 
 class TerrainType(object):
   """
@@ -155,6 +160,22 @@ class PUDFileReader(object):
       (PudFileError) When end-of-file is unexpected.
     """
 
+    for name, data in self.readrawsections():
+      yield name, self._parsesection(name, data, len(data))
+
+  #-------------------------------------------------------------------------------------------------
+
+  def readrawsections(self):
+    """
+    Reads each section from the PUD file without parsing it.
+
+    Yields:
+      (tuple) Containing the section name and (str) raw section data.
+
+    exception:
+      (PudFileError) When end-of-file is unexpected.
+    """
+
     with open(self.filename, 'rb') as f:
       while True:
         name = f.read(const.SECTIONNAME_LEN)
@@ -162,15 +183,15 @@ class PUDFileReader(object):
           break
 
         length = f.read(const.SECTIONDATA_LEN)
-        if length == '':
+        if len(length) != const.SECTIONDATA_LEN:
           raise exception.PudFileError('Unexpected end-of-file encountered at %d.' % f.tell())
-        length = struct.unpack('L', length)[0]
+        length = struct.unpack('=L', length)[0]
 
         data = f.read(length)
-        if data == '':
+        if len(data) != length:
           raise exception.PudFileError('Unexpected end-of-file encountered at %d.' % f.tell())
 
-        yield name, self._parsesection(name, data, length)
+        yield name, data
 
   #-------------------------------------------------------------------------------------------------
 
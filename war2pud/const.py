@@ -13,4 +13,9 @@ MAX_MAP_HEIGHT  = 128
 MAX_MAP_WIDTH   = 128
 MAX_PLAYERS     = 16
 TILE_WIDTH      = 32
-TILE_HEIGHT     = 32
\ No newline at end of file
+TILE_HEIGHT     = 32
+
+GOLD_MINE       = 0x5c
+OIL_PATCH       = 0x5d
+HUMAN_START     = 0x5e
+ORC_START       = 0x5f
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+#  This file is part of war2pud.
+#
+#  Copyright (c) 2012 Beau Hastings. All rights reserved.
+#  License: GNU GPL version 2, see LICENSE for more details.
+#
+#  Author: Beau Hastings <beausy@gmail.com>
+
+# Standard Python imports.
+import os
+import struct
+
+# Application imports.
+import const
+import exception
+
+# 3rd party imports.
+import numpy
+
+"""
+(list) Fields of a corpus index record after the map id, which is sized to the longest id.
+"""
+INDEX_FIELDS = [('width',   '<u2'),
+                ('height',  '<u2'),
+                ('terrain', '<u2')]
+
+"""
+(tuple) Sections that can be packed into a corpus, one tile code per map tile.
+"""
+LAYERS = ('MTXM', 'SQM ', 'REGM')
+
+"""
+(int) Number of maps scanned at a time by `Corpus.tilecounts`.
+"""
+CHUNK_MAPS = 256
+
+#---------------------------------------------------------------------------------------------------
+
+class Corpus(object):
+  """
+  A set of maps whose tile layers are stored as memory-mapped arrays of shape
+  (maps, MAX_MAP_HEIGHT, MAX_MAP_WIDTH), zero-padded beyond each map's true dimensions.
+  """
+
+  """
+  (str) Directory holding the corpus files.
+  """
+  directory = ''
+
+  """
+  (numpy.ndarray) An `id` and `INDEX_FIELDS` record for each map.
+  """
+  index = None
+
+  """
+  (dict) Memory-mapped tile arrays by section name.
+  """
+  layers = {}
+
+  def __init__(self, directory):
+    """
+    Opens a corpus written by `pack`.
+
+    Args:
+      directory (str) Directory holding the corpus files.
+    """
+
+    self.directory = directory
+    self.index = numpy.load(os.path.join(directory, 'index.npy'))
+
+    self.layers = {}
+    for name in LAYERS:
+      path = _layerpath(directory, name)
+      if os.path.exists(path):
+        self.layers[name] = numpy.load(path, mmap_mode='r')
+
+  def __len__(self):
+    return len(self.index)
+
+  def __getitem__(self, name):
+    return self.layers[name]
+
+  def __repr__(self):
+    return '<%s(%r, %d maps, %r)>' % (self.__class__.__name__,
+                                      self.directory,
+                                      len(self.index),
+                                      sorted(self.layers.keys()))
+
+  #-------------------------------------------------------------------------------------------------
+
+  def valid(self, maps):
+    """
+    Masks the tiles that lie within each map's true dimensions.
+
+    The mask is built in memory, so pass a subset of the corpus, e.g. `CHUNK_MAPS` maps at a time,
+    rather than all maps at once.
+
+    Args:
+      maps (numpy.ndarray) Index, indices or boolean mask of the maps to include.
+
+    Returns:
+      (numpy.ndarray) Boolean array of shape (maps, MAX_MAP_HEIGHT, MAX_MAP_WIDTH).
+    """
+
+    index = numpy.atleast_1d(self.index[maps])
+
+    rows = numpy.arange(const.MAX_MAP_HEIGHT)[None, :, None] < index['height'][:, None, None]
+    cols = numpy.arange(const.MAX_MAP_WIDTH)[None, None, :] < index['width'][:, None, None]
+    return rows & cols
+
+  #-------------------------------------------------------------------------------------------------
+
+  def tilecounts(self, name='MTXM', maps=None):
+    """
+    Counts how often each tile code is used.
+
+    Args:
+      name (str)           Section name of the layer.
+      maps (numpy.ndarray) Indices or boolean mask of the maps to include. (default: all maps)
+
+    Returns:
+      (numpy.ndarray) Number of tiles with each of the 65,536 codes, padding excluded.
+    """
+
+    selected = numpy.arange(len(self.index))
+    if maps is not None:
+      selected = selected[maps]
+
+    # Scan the maps in chunks, so that only part of the layer has to be paged in at once.
+    counts = numpy.zeros(0x10000, dtype=numpy.int64)
+    for start in range(0, len(selected), CHUNK_MAPS):
+      chunk = selected[start:start + CHUNK_MAPS]
+      tiles = self.layers[name][chunk]
+      counts += numpy.bincount(tiles[self.valid(chunk)], minlength=0x10000)
+
+    return counts
+
+#---------------------------------------------------------------------------------------------------
+
+def pack(directory, maps, layers=('MTXM',)):
+  """
+  Packs the tile layers of many maps into a corpus.
+
+  Args:
+    directory (str)  Directory to write the corpus files to. It is created if needed.
+    maps      (list) (id, sections) pairs, where `sections` yields the (name, data) pairs of a map,
+                     e.g. as returned by `PUDFileReader.readrawsections`.
+    layers    (list) Names of the sections to pack, from `LAYERS`.
+
+  Returns:
+    (Corpus) The packed corpus.
+
+  exception:
+    (SectionError) When a layer is not one of `LAYERS`, or a map lacks a section.
+    (MapError)     When map dimensions are out of bounds.
+  """
+
+  for name in layers:
+    if not name in LAYERS:
+      raise exception.SectionError('Section `%s` cannot be packed into a corpus' % name)
+
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+
+  # Drop layers left over from an earlier pack, so that `Corpus` does not pick them up.
+  for name in LAYERS:
+    path = _layerpath(directory, name)
+    if not name in layers and os.path.exists(path):
+      os.remove(path)
+
+  shape  = (len(maps), const.MAX_MAP_HEIGHT, const.MAX_MAP_WIDTH)
+  idsize = max([len(id) for id, sections in maps] or [1])
+  index  = numpy.zeros(len(maps), dtype=[('id', 'S%d' % idsize)] + INDEX_FIELDS)
+  arrays = dict((name, numpy.lib.format.open_memmap(_layerpath(directory, name), mode='w+',
+                                                    dtype='<u2', shape=shape))
+                for name in layers)
+
+  for i, (id, sections) in enumerate(maps):
+    sections = dict(sections)
+
+    if not 'DIM ' in sections:
+      raise exception.SectionError('Section `DIM ` is missing from `%s`' % id)
+    width, height = struct.unpack_from('=HH', sections['DIM '])
+
+    if width > const.MAX_MAP_WIDTH:
+      raise exception.MapError('Map width of `%s` is greater than the maximum of %d'
+                               % (id, const.MAX_MAP_WIDTH))
+
+    if height > const.MAX_MAP_HEIGHT:
+      raise exception.MapError('Map height of `%s` is greater than the maximum of %d'
+                               % (id, const.MAX_MAP_HEIGHT))
+
+    terrain = sections.get('ERAX', sections.get('ERA ', '\x00\x00'))
+    index[i] = (id, width, height, struct.unpack_from('=H', terrain)[0])
+
+    for name, array in arrays.items():
+      if not name in sections:
+        raise exception.SectionError('Section `%s` is missing from `%s`' % (name, id))
+
+      tiles = numpy.frombuffer(sections[name], dtype='<u2', count=width * height)
+      array[i, :height, :width] = tiles.reshape(height, width)
+
+  for array in arrays.values():
+    array.flush()
+  del arrays
+
+  numpy.save(os.path.join(directory, 'index.npy'), index)
+
+  return Corpus(directory)
+
+#---------------------------------------------------------------------------------------------------
+
+def _layerpath(directory, name):
+  """
+  Returns the path of the file holding a layer.
+  """
+
+  return os.path.join(directory, name.strip().lower() + '.npy')
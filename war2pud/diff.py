@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+#
+#  This file is part of war2pud.
+#
+#  Copyright (c) 2012 Beau Hastings. All rights reserved.
+#  License: GNU GPL version 2, see LICENSE for more details.
+#
+#  Author: Beau Hastings <beausy@gmail.com>
+
+# Standard Python imports.
+import bisect
+import collections
+import struct
+import zlib
+
+# Application imports.
+import exception
+
+# 3rd party imports.
+import numpy
+
+"""
+(numpy.dtype) Layout of a single UNIT record.
+"""
+UNIT_DTYPE = numpy.dtype([('x',        '<u2'),
+                          ('y',        '<u2'),
+                          ('type',     'u1'),
+                          ('owner',    'u1'),
+                          ('resource', '<u2')])
+
+"""
+(dict) Element type of each section compared element-wise. Sections not listed here (e.g. UDTA,
+UGRD, ALOW) are compared byte-wise.
+"""
+SECTION_DTYPES = {
+  'OWNR': numpy.dtype('u1'),
+  'SIDE': numpy.dtype('u1'),
+  'AIPL': numpy.dtype('u1'),
+  'SGLD': numpy.dtype('<u2'),
+  'SLBR': numpy.dtype('<u2'),
+  'SOIL': numpy.dtype('<u2'),
+  'MTXM': numpy.dtype('<u2'),
+  'SQM ': numpy.dtype('<u2'),
+  'REGM': numpy.dtype('<u2'),
+  'UNIT': UNIT_DTYPE,
+}
+
+#---------------------------------------------------------------------------------------------------
+
+class SectionPatch(object):
+  """
+  Describes the change of a single section between two revisions.
+  """
+
+  ADD    = 'add'
+  REMOVE = 'remove'
+  CHANGE = 'change'
+
+  """
+  (str) Section name.
+  """
+  name = ''
+
+  """
+  (str) One of `ADD`, `REMOVE` or `CHANGE`.
+  """
+  op = CHANGE
+
+  """
+  (numpy.dtype) Element type the indices and values refer to.
+  """
+  dtype = None
+
+  """
+  (int) Number of elements in the old section.
+  """
+  oldlength = 0
+
+  """
+  (int) Number of elements in the new section.
+  """
+  length = 0
+
+  """
+  (int) CRC-32 of the old section payload.
+  """
+  checksum = 0
+
+  """
+  (numpy.ndarray) Indices of the elements that differ in the new section.
+  """
+  indices = None
+
+  """
+  (numpy.ndarray) Indices of the old elements that were removed. Only record sections (UNIT) are
+  patched this way; other sections are patched in place and leave this `None`.
+  """
+  removed = None
+
+  """
+  (numpy.ndarray) New values of the elements at `indices`.
+  """
+  values = None
+
+  """
+  (str) Raw payload of an added section.
+  """
+  data = None
+
+  def __init__(self, name, op, dtype=None, oldlength=0, length=0, indices=None, values=None,
+               data=None, checksum=0, removed=None):
+    """
+    Create a new `SectionPatch` instance.
+    """
+
+    self.name      = name
+    self.op        = op
+    self.dtype     = dtype
+    self.oldlength = oldlength
+    self.length    = length
+    self.indices   = indices
+    self.values    = values
+    self.data      = data
+    self.checksum  = checksum
+    self.removed   = removed
+
+  def __repr__(self):
+    if self.op == self.CHANGE:
+      return '<%s(%r, %s, %d of %d)>' % (self.__class__.__name__, self.name, self.op,
+                                         len(self.indices), self.length)
+    return '<%s(%r, %s)>' % (self.__class__.__name__, self.name, self.op)
+
+  #-------------------------------------------------------------------------------------------------
+
+  def apply(self, data):
+    """
+    Applies the patch to the raw payload of the old section.
+
+    Args:
+      data (str) Raw payload of the old section.
+
+    Returns:
+      (str) Raw payload of the new section.
+
+    exception:
+      (PatchError) When `data` is not the section the patch was made from.
+    """
+
+    if self.op == self.ADD:
+      return self.data
+
+    if zlib.crc32(data) & 0xffffffff != self.checksum:
+      raise exception.PatchError('Section `%s` is not the revision the patch was made from'
+                                 % self.name)
+
+    old = _asarray(data, self.dtype)
+    new = numpy.empty(self.length, dtype=self.dtype)
+
+    if self.removed is None:
+      common = min(self.oldlength, self.length)
+      new[:common] = old[:common]
+    else:
+      kept = numpy.ones(self.length, dtype=bool)
+      kept[self.indices] = False
+      new[kept] = numpy.delete(old, self.removed)
+
+    new[self.indices] = self.values
+
+    return new.tobytes()
+
+  #-------------------------------------------------------------------------------------------------
+
+  def units(self, data):
+    """
+    Classifies the changes of a UNIT section patch.
+
+    Records that are identical in both revisions are dropped first, so inserting or deleting a
+    unit does not affect the units after it. The remaining records are paired by type and owner,
+    in the order they appear.
+
+    Args:
+      data (str) Raw payload of the old UNIT section.
+
+    Returns:
+      (dict) Containing `added`, `removed`, `moved` and `changed` record arrays. Moved units had
+      their position changed and are listed as they are in the new revision, as are changed units,
+      whose position stayed the same but whose `resource` value did not.
+    """
+
+    empty = numpy.empty(0, dtype=UNIT_DTYPE)
+
+    if self.op == self.ADD:
+      old, new = empty, _asarray(self.data, UNIT_DTYPE)
+    elif self.op == self.REMOVE:
+      old, new = _asarray(data, UNIT_DTYPE), empty
+    else:
+      old, new = _asarray(data, UNIT_DTYPE), _asarray(self.apply(data), UNIT_DTYPE)
+
+    # A UNIT record is 8 bytes, so whole records compare as a single integer.
+    oldsame, newsame = _pair(numpy.ascontiguousarray(old).view('<u8'),
+                             numpy.ascontiguousarray(new).view('<u8'))
+    old = numpy.delete(old, oldsame)
+    new = numpy.delete(new, newsame)
+
+    oldpaired, newpaired = _pair(old['type'] | old['owner'].astype(numpy.uint16) << 8,
+                                      new['type'] | new['owner'].astype(numpy.uint16) << 8)
+
+    before = old[oldpaired]
+    after  = new[newpaired]
+    moved  = (before['x'] != after['x']) | (before['y'] != after['y'])
+
+    return dict(added   = numpy.delete(new, newpaired),
+                removed = numpy.delete(old, oldpaired),
+                moved   = after[moved],
+                changed = after[~moved])
+
+#---------------------------------------------------------------------------------------------------
+
+class Patch(object):
+  """
+  A set of section patches that turns one revision of a map into another.
+  """
+
+  """
+  (list) Section patches, one for each section that differs.
+  """
+  sections = []
+
+  """
+  (list) Section names in the order they appear in the new revision.
+  """
+  order = []
+
+  def __init__(self, sections=None, order=None):
+    """
+    Create a new `Patch` instance.
+
+    Args:
+      sections (list) `SectionPatch` instances.
+      order    (list) Section names of the new revision.
+    """
+
+    self.sections = sections or []
+    self.order    = order or []
+
+  def __iter__(self):
+    return iter(self.sections)
+
+  def __len__(self):
+    return len(self.sections)
+
+  def __getitem__(self, name):
+    for section in self.sections:
+      if section.name == name:
+        return section
+    raise KeyError(name)
+
+  def __repr__(self):
+    return '<%s(%r)>' % (self.__class__.__name__, [s.name for s in self.sections])
+
+  #-------------------------------------------------------------------------------------------------
+
+  def apply(self, sections):
+    """
+    Applies the patch to the sections of the old revision.
+
+    Args:
+      sections (iterable) (name, data) pairs or a dict of raw section payloads.
+
+    Returns:
+      (OrderedDict) Raw section payloads of the new revision.
+
+    exception:
+      (PatchError) When a patched section is missing from `sections`.
+    """
+
+    old = _todict(sections)
+    new = collections.OrderedDict()
+    patches = dict((section.name, section) for section in self.sections)
+
+    for name in self.order:
+      patch = patches.get(name)
+      if patch is None:
+        if not name in old:
+          raise exception.PatchError('Section `%s` is missing' % name)
+        new[name] = old[name]
+      elif patch.op == SectionPatch.ADD:
+        new[name] = patch.apply(None)
+      else:
+        if not name in old:
+          raise exception.PatchError('Section `%s` is missing' % name)
+        new[name] = patch.apply(old[name])
+
+    return new
+
+#---------------------------------------------------------------------------------------------------
+
+def diff(old, new):
+  """
+  Compares two revisions of a map.
+
+  Sections whose raw payloads are byte-equal are skipped, the remaining ones are compared
+  element-wise.
+
+  Args:
+    old (iterable) (name, data) pairs or a dict of raw section payloads, e.g. as returned by
+                   `PUDFileReader.readrawsections`.
+    new (iterable) The same for the new revision.
+
+  Returns:
+    (Patch) The changes from `old` to `new`.
+  """
+
+  old = _todict(old)
+  new = _todict(new)
+
+  sections = []
+
+  for name, data in new.items():
+    if not name in old:
+      sections.append(SectionPatch(name, SectionPatch.ADD, data=data))
+    elif old[name] != data:
+      sections.append(_diffsection(name, old[name], data))
+
+  for name in old:
+    if not name in new:
+      sections.append(SectionPatch(name, SectionPatch.REMOVE))
+
+  return Patch(sections, list(new.keys()))
+
+#---------------------------------------------------------------------------------------------------
+
+def pack(sections):
+  """
+  Packs raw section payloads into PUD file data.
+
+  Args:
+    sections (iterable) (name, data) pairs or a dict of raw section payloads.
+
+  Returns:
+    (str) PUD file data.
+  """
+
+  return ''.join(name + struct.pack('=L', len(data)) + data
+                 for name, data in _todict(sections).items())
+
+#---------------------------------------------------------------------------------------------------
+
+def _diffsection(name, olddata, newdata):
+  """
+  Compares the raw payloads of a section element-wise.
+
+  Returns:
+    (SectionPatch) The changed elements.
+  """
+
+  dtype = SECTION_DTYPES.get(name, numpy.dtype('u1'))
+  if len(olddata) % dtype.itemsize or len(newdata) % dtype.itemsize:
+    dtype = numpy.dtype('u1')
+
+  old = _asarray(olddata, dtype)
+  new = _asarray(newdata, dtype)
+  checksum = zlib.crc32(olddata) & 0xffffffff
+
+  # Indices are stored in the narrowest type that fits, e.g. uint16 for a 128x128 tile map.
+  indextype = numpy.min_scalar_type(max(old.size, new.size))
+
+  if dtype == UNIT_DTYPE:
+    removed, indices = _diffrecords(old, new)
+    return SectionPatch(name, SectionPatch.CHANGE, dtype, old.size, new.size,
+                        indices.astype(indextype), new[indices], checksum=checksum,
+                        removed=removed.astype(indextype))
+
+  common  = min(old.size, new.size)
+  indices = numpy.concatenate((numpy.flatnonzero(old[:common] != new[:common]),
+                               numpy.arange(common, new.size)))
+
+  return SectionPatch(name, SectionPatch.CHANGE, dtype, old.size, new.size,
+                      indices.astype(indextype), new[indices], checksum=checksum)
+
+def _diffrecords(old, new):
+  """
+  Compares UNIT records as a multiset, so that inserting or deleting a record does not mark the
+  records after it as changed.
+
+  Returns:
+    (tuple) Containing the indices of the removed `old` records and of the added `new` records.
+  """
+
+  # A UNIT record is 8 bytes, so whole records compare as a single integer.
+  oldpaired, newpaired = _pair(numpy.ascontiguousarray(old).view('<u8'),
+                               numpy.ascontiguousarray(new).view('<u8'))
+
+  # Records kept by the patch have to stay in order; any that were reordered are replaced.
+  order = numpy.argsort(newpaired)
+  oldpaired, newpaired = oldpaired[order], newpaired[order]
+  inorder = _increasing(oldpaired)
+
+  return (numpy.delete(numpy.arange(len(old)), oldpaired[inorder]),
+          numpy.delete(numpy.arange(len(new)), newpaired[inorder]))
+
+def _increasing(values):
+  """
+  Finds a longest strictly increasing subsequence.
+
+  Returns:
+    (numpy.ndarray) Boolean mask of the values in the subsequence.
+  """
+
+  tails    = []  # Smallest last value of an increasing run of each length.
+  tailat   = []  # Position of that value.
+  previous = numpy.full(len(values), -1, dtype=numpy.intp)
+
+  for position, value in enumerate(values):
+    length = bisect.bisect_left(tails, value)
+    if length:
+      previous[position] = tailat[length - 1]
+    if length == len(tails):
+      tails.append(value)
+      tailat.append(position)
+    else:
+      tails[length]  = value
+      tailat[length] = position
+
+  mask = numpy.zeros(len(values), dtype=bool)
+  position = tailat[-1] if tailat else -1
+  while position >= 0:
+    mask[position] = True
+    position = previous[position]
+
+  return mask
+
+def _pair(old, new):
+  """
+  Pairs equal keys of two arrays. A key that repeats is paired as often as it occurs in both.
+
+  Returns:
+    (tuple) Containing the paired indices into `old` and `new`.
+  """
+
+  inverse = numpy.unique(numpy.concatenate((old, new)), return_inverse=True)[1]
+  ids  = inverse.astype(numpy.int64)
+  span = max(len(old), len(new)) + 1
+
+  # Number each repeat of a key, so that the combined values are unique within each array.
+  oldids = ids[:len(old)] * span + _occurrences(ids[:len(old)])
+  newids = ids[len(old):] * span + _occurrences(ids[len(old):])
+
+  _, oldindices, newindices = numpy.intersect1d(oldids, newids, assume_unique=True,
+                                                return_indices=True)
+  return oldindices, newindices
+
+def _occurrences(ids):
+  """
+  Numbers the repeats of each value, in the order they appear.
+  """
+
+  if not len(ids):
+    return numpy.zeros(0, dtype=numpy.int64)
+
+  order    = numpy.argsort(ids, kind='mergesort')
+  ordered  = ids[order]
+  position = numpy.arange(len(ids))
+  first    = numpy.concatenate(([True], ordered[1:] != ordered[:-1]))
+
+  occurrences = numpy.empty(len(ids), dtype=numpy.int64)
+  occurrences[order] = position - numpy.maximum.accumulate(numpy.where(first, position, 0))
+  return occurrences
+
+def _asarray(data, dtype):
+  """
+  Views a raw section payload as an array of `dtype` elements.
+  """
+
+  return numpy.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+
+def _todict(sections):
+  """
+  Turns (name, data) pairs into an ordered dict.
+  """
+
+  if isinstance(sections, dict):
+    return sections
+  return collections.OrderedDict(sections)
@@ -23,4 +23,10 @@ class MapError(Exception):
   """ Raised when map dimensions are out of bounds. """
 
 class TerrainError(Exception):
-  """ Raised when an unknown terrain type is encountered. """
\ No newline at end of file
+  """ Raised when an unknown terrain type is encountered. """
+
+class PatchError(Exception):
+  """ Raised when a patch does not apply to the given sections. """
+
+class ExportError(Exception):
+  """ Raised when a map cannot be exported. """
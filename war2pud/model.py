@@ -12,13 +12,37 @@ import os
 
 # Application imports.
 import const
+import exception
 import model
+import render
+import tileset
 import util
 
 # 3rd party imports.
 import Image
 import numpy
 
+class PlayerType(object):
+  """
+  Player type codes, as stored in the OWNR section.
+
+  Computer players have two codes each, so filter them with `numpy.in1d` over `COMPUTERS` or
+  `PASSIVE_COMPUTERS`, e.g. `numpy.in1d(table['type'], PlayerType.COMPUTERS)`.
+  """
+  PASSIVE_COMPUTER_0 = 0
+  COMPUTER_1         = 1
+  PASSIVE_COMPUTER   = 2
+  UNUSED             = 3
+  COMPUTER           = 4
+  HUMAN              = 5
+  RESCUE_PASSIVE     = 6
+  RESCUE_ACTIVE      = 7
+
+  PASSIVE_COMPUTERS  = (PASSIVE_COMPUTER_0, PASSIVE_COMPUTER)
+  COMPUTERS          = (COMPUTER_1, COMPUTER)
+
+#---------------------------------------------------------------------------------------------------
+
 class Unit(object):
   """
   Represents a game unit.
@@ -86,6 +110,193 @@ class Player(object):
 
 #---------------------------------------------------------------------------------------------------
 
+class PlayerTable(object):
+  """
+  Represents the players of one or more maps as a structured array, one record per player slot.
+
+  Fields are kept as the integer codes stored in the PUD file; names are only resolved on request.
+  """
+
+  """
+  (numpy.dtype) Layout of a player record.
+  """
+  DTYPE = numpy.dtype([('map',    '<u4'),
+                       ('slot',   'u1'),
+                       ('type',   'u1'),
+                       ('race',   'u1'),
+                       ('ai',     'u1'),
+                       ('gold',   '<u2'),
+                       ('lumber', '<u2'),
+                       ('oil',    '<u2')])
+
+  """
+  (dict) Field and element type of each player section.
+  """
+  SECTIONS = {
+    'OWNR': ('type',   numpy.dtype('u1')),
+    'SIDE': ('race',   numpy.dtype('u1')),
+    'AIPL': ('ai',     numpy.dtype('u1')),
+    'SGLD': ('gold',   numpy.dtype('<u2')),
+    'SLBR': ('lumber', numpy.dtype('<u2')),
+    'SOIL': ('oil',    numpy.dtype('<u2')),
+  }
+
+  """
+  (numpy.ndarray) Player records.
+  """
+  records = None
+
+  def __init__(self, records=None):
+    """
+    Create a new `PlayerTable` instance.
+
+    Args:
+      records (numpy.ndarray) Player records of type `DTYPE`.
+    """
+
+    if records is None:
+      records = numpy.empty(0, dtype=self.DTYPE)
+    self.records = records
+
+  def __len__(self):
+    return len(self.records)
+
+  def __getitem__(self, key):
+    if isinstance(key, basestring):
+      return self.records[key]
+    return PlayerTable(self.records[key])
+
+  def __repr__(self):
+    return '<%s(%d maps, %d players)>' % (self.__class__.__name__,
+                                          len(numpy.unique(self.records['map'])),
+                                          len(self.records))
+
+  #-------------------------------------------------------------------------------------------------
+
+  @staticmethod
+  def fromsections(sections, mapid=0):
+    """
+    Builds the player table of a map.
+
+    Args:
+      sections (iterable) (name, data) pairs, e.g. as returned by `PUDFileReader.readrawsections`
+                          or `PUDFileReader.readsections`. Other sections are ignored.
+      mapid    (int)      Identifies the map within a batch.
+
+    Returns:
+      (PlayerTable) One record for each of the `MAX_PLAYERS` slots.
+    """
+
+    records = numpy.zeros(const.MAX_PLAYERS, dtype=PlayerTable.DTYPE)
+    records['map']  = mapid
+    records['slot'] = numpy.arange(const.MAX_PLAYERS)
+    records['type'] = PlayerType.UNUSED
+
+    for name, data in sections:
+      if not name in PlayerTable.SECTIONS:
+        continue
+
+      field, dtype = PlayerTable.SECTIONS[name]
+      if isinstance(data, str):
+        records[field] = numpy.frombuffer(data, dtype=dtype, count=const.MAX_PLAYERS)
+      else:
+        records[field] = data
+
+    return PlayerTable(records)
+
+  @staticmethod
+  def concatenate(tables):
+    """
+    Joins the player tables of several maps.
+
+    Args:
+      tables (iterable) `PlayerTable` instances.
+
+    Returns:
+      (PlayerTable) All players of all maps.
+    """
+
+    records = [table.records for table in tables]
+    if not records:
+      return PlayerTable()
+    return PlayerTable(numpy.concatenate(records))
+
+  #-------------------------------------------------------------------------------------------------
+
+  def maps(self, mask=None):
+    """
+    Lists the maps that have at least one player matching `mask`.
+
+    Args:
+      mask (numpy.ndarray) Boolean mask over the records. (default: all players)
+
+    Returns:
+      (numpy.ndarray) Sorted map IDs.
+    """
+
+    if mask is None:
+      return numpy.unique(self.records['map'])
+    return numpy.unique(self.records['map'][mask])
+
+  #-------------------------------------------------------------------------------------------------
+
+  def names(self, field, reader):
+    """
+    Resolves the codes of a field to names.
+
+    Args:
+      field  (str)           One of `type`, `race` or `ai`.
+      reader (PUDFileReader) A reader with its assets loaded.
+
+    Returns:
+      (numpy.ndarray) Name of each record, or `None` when the code is unknown.
+    """
+
+    if field == 'type':
+      rows = dict(enumerate(reader._allowedplayertypes))
+    elif field == 'race':
+      rows = dict((index, row['name']) for index, row in reader._allowedraces.items())
+    elif field == 'ai':
+      rows = dict((index, row['name']) for index, row in reader._allowedai.items())
+    else:
+      raise KeyError(field)
+
+    names = numpy.empty(256, dtype=object)
+    for index, name in rows.items():
+      names[index] = name
+
+    return names[self.records[field]]
+
+  #-------------------------------------------------------------------------------------------------
+
+  def toplayers(self, reader):
+    """
+    Creates `Player` instances for the records.
+
+    Args:
+      reader (PUDFileReader) A reader with its assets loaded.
+
+    Returns:
+      (list) `Player` instances.
+    """
+
+    types, races, ais = [self.names(field, reader) for field in ('type', 'race', 'ai')]
+
+    players = []
+    for index, record in enumerate(self.records):
+      player = model.Player()
+      player.type   = types[index]
+      player.race   = races[index]
+      player.ai     = ais[index]
+      player.gold   = int(record['gold'])
+      player.lumber = int(record['lumber'])
+      player.oil    = int(record['oil'])
+      players.append(player)
+
+    return players
+
+#---------------------------------------------------------------------------------------------------
+
 class PUD(object):
   """
   Represents a map.
@@ -132,7 +343,7 @@ class PUD(object):
   players = []
 
   """
-  (list) Tiles.
+  (numpy.ndarray) MTXM tile codes, of shape (height, width).
   """
   tiles = None
 
@@ -149,56 +360,54 @@ class PUD(object):
 
   #-------------------------------------------------------------------------------------------------
 
-  def export(self, filename=None):
+  def export(self, filename, format=None, stream=False):
     """
     Exports the map as an image.
 
     Args:
-      filename (str) The destination image filename.
+      filename (str)  The destination image filename, or a binary file object.
+      format   (str)  Image format. (default: taken from the `filename` extension)
+      stream   (bool) Compose and encode the image one row of tiles at a time, so that memory use
+                      is proportional to the map width rather than its area. Only PNG and BMP
+                      images can be streamed.
+
+    exception:
+      (ExportError) When the image format cannot be streamed.
     """
 
-    basedir = os.path.abspath(os.path.dirname(__file__))
-    datadir = os.path.join(basedir, '..', 'data')
+    tiles   = tileset.load(self.terrain)
+    indices = tiles.atlasindices(numpy.asarray(self.tiles).reshape(self.height, self.width))
+    strips  = render.strips(indices, tiles.tiles)
+
+    if not stream:
+      # Without an explicit format, PIL infers it from the filename extension.
+      image = Image.fromarray(numpy.concatenate(list(strips)))
+      image.save(filename, format)
+      return
 
-    if self.terrain == 'forest':
-      tilemap = 'FOREST.BMP'
-    elif self.terrain == 'winter':
-      tilemap = 'WINTER.BMP'
-    elif self.terrain == 'wasteland':
-      tilemap = 'WASTE.BMP'
-    elif self.terrain == 'swamp':
-      tilemap = 'SWAMP.BMP'
+    if format is None and isinstance(filename, basestring):
+      format = os.path.splitext(filename)[1][1:]
+    format = (format or '').lower()
+
+    if not format in render.WRITERS:
+      raise exception.ExportError('Cannot stream `%s` images' % format)
+
+    if isinstance(filename, basestring):
+      with open(filename, 'wb') as f:
+        self._exportstrips(f, format, strips)
     else:
-      tilemap = 'FOREST.BMP'
-
-    tilemap_path = os.path.join(datadir, tilemap)
-
-    #copy region: rect = (x, y, width, height); region = im.crop(rect)
-    tilemap = Image.open(tilemap_path)
-    tile = self.tiles[0,0]
-
-    #print [self.tiles[i,0] for i in range(8)]
-
-    #print hex(self.tiles[0,0])
-    #print hex(self.tiles[0,1])
-    #print hex(self.tiles[0,65])
-
-    # 4800px = (4800 / 32) = 150 forest trees
-    # 4320px = (4320 / 32) = 135 - 104 = start of light water
-    #          432 (B0 01) in .pud, 297 difference
-    #
-    # first 104 entries in tileset are units, not tiles
-    # print ((tile * 10) / 32  - 104)
-    #
-    #print tile
-
-    #region = tilemap.crop((tile_offset, 0, tile_offset + 32, 32))
-    #im = Image.new("RGB", (32, 32))
-    #im.paste(region, (0, 0, 32, 32))
-    #im.save(os.path.join(datadir, 'test.bmp'))
-
-    #tile_offset = tile
-    #region = tilemap.crop((4800, 0, 4800 + 32, 32))
-    #im = Image.new("RGB", (32, 32))
-    #im.paste(region, (0, 0, 32, 32))
-    #im.save(os.path.join(datadir, 'test.bmp'))
\ No newline at end of file
+      self._exportstrips(filename, format, strips)
+
+  #-------------------------------------------------------------------------------------------------
+
+  def _exportstrips(self, f, format, strips):
+    """
+    Encodes image strips into a binary file object.
+    """
+
+    writer = render.WRITERS[format](f,
+                                    self.width * const.TILE_WIDTH,
+                                    self.height * const.TILE_HEIGHT)
+    for strip in strips:
+      writer.write(strip)
+    writer.close()
\ No newline at end of file
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+#  This file is part of war2pud.
+#
+#  Copyright (c) 2012 Beau Hastings. All rights reserved.
+#  License: GNU GPL version 2, see LICENSE for more details.
+#
+#  Author: Beau Hastings <beausy@gmail.com>
+
+# Standard Python imports.
+import struct
+import zlib
+
+# Application imports.
+import const
+
+# 3rd party imports.
+import numpy
+
+def loadatlas(image):
+  """
+  Splits a tileset image into tiles.
+
+  Args:
+    image (Image) A tileset with its tiles laid out left to right.
+
+  Returns:
+    (numpy.ndarray) RGB tiles of shape (tiles, TILE_HEIGHT, TILE_WIDTH, 3).
+  """
+
+  pixels = numpy.asarray(image.convert('RGB'), dtype=numpy.uint8)
+  count  = pixels.shape[1] // const.TILE_WIDTH
+
+  pixels = pixels[:const.TILE_HEIGHT, :count * const.TILE_WIDTH]
+  pixels = pixels.reshape(const.TILE_HEIGHT, count, const.TILE_WIDTH, 3).transpose(1, 0, 2, 3)
+  return numpy.ascontiguousarray(pixels)
+
+
+def strips(indices, atlas):
+  """
+  Composes an image one row of tiles at a time.
+
+  Args:
+    indices (numpy.ndarray) Atlas index of each tile, of shape (height, width).
+    atlas   (numpy.ndarray) Tiles as returned by `loadatlas`.
+
+  Yields:
+    (numpy.ndarray) RGB pixels of shape (TILE_HEIGHT, width * TILE_WIDTH, 3).
+  """
+
+  width = indices.shape[1]
+
+  for row in indices:
+    tiles = atlas.take(row, axis=0)
+    yield tiles.transpose(1, 0, 2, 3).reshape(const.TILE_HEIGHT, width * const.TILE_WIDTH, 3)
+
+#---------------------------------------------------------------------------------------------------
+
+class PNGWriter(object):
+  """
+  Encodes a 24-bit PNG image from horizontal strips of pixels.
+  """
+
+  def __init__(self, f, width, height):
+    """
+    Create a new `PNGWriter` instance and write the image header.
+
+    Args:
+      f      (file) Binary output stream.
+      width  (int)  Image width in pixels.
+      height (int)  Image height in pixels.
+    """
+
+    self.f = f
+    self.width = width
+    self.compressor = zlib.compressobj()
+
+    f.write('\x89PNG\r\n\x1a\n')
+    self._chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+  def write(self, pixels):
+    """
+    Appends rows of pixels to the image.
+
+    Args:
+      pixels (numpy.ndarray) RGB pixels of shape (rows, width, 3).
+    """
+
+    # Each scanline is prefixed with filter type 0 (none).
+    rows = numpy.zeros((pixels.shape[0], self.width * 3 + 1), dtype=numpy.uint8)
+    rows[:, 1:] = pixels.reshape(pixels.shape[0], -1)
+
+    data = self.compressor.compress(rows.tobytes())
+    if data:
+      self._chunk('IDAT', data)
+
+  def close(self):
+    """
+    Flushes the remaining image data and writes the image trailer.
+    """
+
+    self._chunk('IDAT', self.compressor.flush())
+    self._chunk('IEND', '')
+
+  def _chunk(self, name, data):
+    self.f.write(struct.pack('>I', len(data)))
+    self.f.write(name)
+    self.f.write(data)
+    self.f.write(struct.pack('>I', zlib.crc32(name + data) & 0xffffffff))
+
+#---------------------------------------------------------------------------------------------------
+
+class BMPWriter(object):
+  """
+  Encodes a 24-bit top-down BMP image from horizontal strips of pixels.
+  """
+
+  def __init__(self, f, width, height):
+    """
+    Create a new `BMPWriter` instance and write the image header.
+
+    Args:
+      f      (file) Binary output stream.
+      width  (int)  Image width in pixels.
+      height (int)  Image height in pixels.
+    """
+
+    self.f = f
+    self.width = width
+    self.stride = (width * 3 + 3) & ~3
+
+    size = self.stride * height
+
+    f.write(struct.pack('<2sIHHI', 'BM', 54 + size, 0, 0, 54))
+    # A negative height stores rows top-down, in the order they are written.
+    f.write(struct.pack('<IiiHHIIiiII', 40, width, -height, 1, 24, 0, size, 2835, 2835, 0, 0))
+
+  def write(self, pixels):
+    """
+    Appends rows of pixels to the image.
+
+    Args:
+      pixels (numpy.ndarray) RGB pixels of shape (rows, width, 3).
+    """
+
+    rows = numpy.zeros((pixels.shape[0], self.stride), dtype=numpy.uint8)
+    rows[:, :self.width * 3] = pixels[:, :, ::-1].reshape(pixels.shape[0], -1)
+    self.f.write(rows.tobytes())
+
+  def close(self):
+    """
+    Finishes the image.
+    """
+    pass
+
+#---------------------------------------------------------------------------------------------------
+
+"""
+(dict) Strip writers by image format.
+"""
+WRITERS = {
+  'png': PNGWriter,
+  'bmp': BMPWriter,
+}
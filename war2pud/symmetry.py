@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+#
+#  This file is part of war2pud.
+#
+#  Copyright (c) 2012 Beau Hastings. All rights reserved.
+#  License: GNU GPL version 2, see LICENSE for more details.
+#
+#  Author: Beau Hastings <beausy@gmail.com>
+
+# Application imports.
+import const
+import diff
+
+# 3rd party imports.
+import numpy
+
+"""
+(tuple) Names of the symmetries that are scored, in report order.
+"""
+SYMMETRIES = (
+  'horizontal',   # Mirrored left to right.
+  'vertical',     # Mirrored top to bottom.
+  'diagonal',     # Mirrored along the main diagonal (square maps only).
+  'antidiagonal', # Mirrored along the anti-diagonal (square maps only).
+  'rotate90',     # Rotated by 90 degrees (square maps only).
+  'rotate180',    # Rotated by 180 degrees.
+)
+
+"""
+(numpy.dtype) Layout of a resource access record.
+"""
+ACCESS_DTYPE = numpy.dtype([('player',  'u1'),
+                            ('x',       '<u2'),
+                            ('y',       '<u2'),
+                            ('mines',   '<u4'),
+                            ('gold',    '<u4'),
+                            ('patches', '<u4'),
+                            ('oil',     '<u4')])
+
+def tilesymmetry(tiles):
+  """
+  Scores how symmetric the terrain of a map is.
+
+  Solid tiles (0x00CV) are compared by their class nibble, boundary tiles (0xGGSV) by their group.
+  The variant is picked at random by the map editor, and a mirror or rotation changes the boundary
+  shape, so neither can be compared.
+
+  Args:
+    tiles (numpy.ndarray) MTXM tile codes, of shape (height, width).
+
+  Returns:
+    (dict) The fraction of tiles, from 0.0 to 1.0, that match their counterpart for each of
+    `SYMMETRIES`, or `None` when a symmetry needs a square map.
+  """
+
+  tiles  = numpy.asarray(tiles)
+  tiles  = numpy.where(tiles >> 8, tiles & 0xff00, tiles & 0xfff0)
+  square = tiles.shape[0] == tiles.shape[1]
+
+  transforms = dict(horizontal   = tiles[:, ::-1],
+                    vertical     = tiles[::-1, :],
+                    diagonal     = tiles.T if square else None,
+                    antidiagonal = tiles[::-1, ::-1].T if square else None,
+                    rotate90     = numpy.rot90(tiles) if square else None,
+                    rotate180    = tiles[::-1, ::-1])
+
+  scores = {}
+  for name in SYMMETRIES:
+    if transforms[name] is None:
+      scores[name] = None
+    else:
+      scores[name] = float(numpy.mean(tiles == transforms[name]))
+
+  return scores
+
+#---------------------------------------------------------------------------------------------------
+
+def unitsymmetry(units, width, height, tolerance=3):
+  """
+  Scores how symmetric the unit placements of a map are.
+
+  A unit matches when a unit of the same type lies within `tolerance` tiles of its transformed
+  position. Owners are not compared, since a symmetric map swaps them, and human and orc start
+  locations count as the same type.
+
+  Args:
+    units     (list)  `Unit` instances, or a UNIT record array.
+    width     (int)   Map width.
+    height    (int)   Map height.
+    tolerance (int)   Allowed offset in tiles, which absorbs unit footprints since positions refer
+                      to the top-left tile of a unit.
+
+  Returns:
+    (dict) The fraction of units, from 0.0 to 1.0, that match for each of `SYMMETRIES`, or `None`
+    when a symmetry needs a square map.
+  """
+
+  units = _asrecords(units)
+  x = units['x'].astype(numpy.intp)
+  y = units['y'].astype(numpy.intp)
+
+  square = width == height
+  right  = width - 1
+  bottom = height - 1
+
+  transforms = dict(horizontal   = (right - x, y),
+                    vertical     = (x, bottom - y),
+                    diagonal     = (y, x) if square else None,
+                    antidiagonal = (right - y, bottom - x) if square else None,
+                    rotate90     = (y, right - x) if square else None,
+                    rotate180    = (right - x, bottom - y))
+
+  # Pairs of units of the same type, compared for every symmetry at once.
+  types = numpy.where(units['type'] == const.ORC_START, const.HUMAN_START, units['type'])
+  sametype = types[:, None] == types[None, :]
+
+  scores = {}
+  for name in SYMMETRIES:
+    if transforms[name] is None:
+      scores[name] = None
+    elif not len(units):
+      scores[name] = 1.0
+    else:
+      tx, ty = transforms[name]
+      distance = numpy.maximum(numpy.abs(tx[:, None] - x[None, :]),
+                               numpy.abs(ty[:, None] - y[None, :]))
+      scores[name] = float(numpy.mean((sametype & (distance <= tolerance)).any(axis=1)))
+
+  return scores
+
+#---------------------------------------------------------------------------------------------------
+
+def resourceaccess(units, radius=16):
+  """
+  Sums the resources near each start location.
+
+  Args:
+    units  (list) `Unit` instances, or a UNIT record array.
+    radius (int)  Distance in tiles from a start location at which resources count.
+
+  Returns:
+    (numpy.ndarray) An `ACCESS_DTYPE` record for each start location, ordered by player.
+    `gold` and `oil` are the summed `resource` values of the gold mines and oil patches in range.
+  """
+
+  units  = _asrecords(units)
+  starts = units[(units['type'] == const.HUMAN_START) | (units['type'] == const.ORC_START)]
+  starts = starts[numpy.argsort(starts['owner'], kind='mergesort')]
+
+  access = numpy.zeros(len(starts), dtype=ACCESS_DTYPE)
+  access['player'] = starts['owner']
+  access['x']      = starts['x']
+  access['y']      = starts['y']
+
+  for unittype, count, total in ((const.GOLD_MINE, 'mines', 'gold'),
+                                 (const.OIL_PATCH, 'patches', 'oil')):
+    resources = units[units['type'] == unittype]
+
+    dx = starts['x'].astype(numpy.float64)[:, None] - resources['x'][None, :]
+    dy = starts['y'].astype(numpy.float64)[:, None] - resources['y'][None, :]
+    inrange = numpy.hypot(dx, dy) <= radius
+
+    access[count] = inrange.sum(axis=1)
+    access[total] = numpy.dot(inrange, resources['resource'].astype(numpy.uint64))
+
+  return access
+
+#---------------------------------------------------------------------------------------------------
+
+def fairness(access):
+  """
+  Scores how evenly resources are spread across start locations.
+
+  Args:
+    access (numpy.ndarray) Records as returned by `resourceaccess`.
+
+  Returns:
+    (dict) The ratio of the smallest to the largest value across players, from 0.0 to 1.0, for
+    `mines`, `gold`, `patches` and `oil`. A value all players lack scores 1.0.
+  """
+
+  scores = {}
+  for field in ('mines', 'gold', 'patches', 'oil'):
+    values = access[field]
+    if not len(values) or not values.max():
+      scores[field] = 1.0
+    else:
+      scores[field] = float(values.min()) / values.max()
+
+  return scores
+
+#---------------------------------------------------------------------------------------------------
+
+def score(tiles, units, radius=16, tolerance=3):
+  """
+  Scores the symmetry and fairness of a map.
+
+  Args:
+    tiles     (numpy.ndarray) MTXM tile codes, of shape (height, width).
+    units     (list)          `Unit` instances, or a UNIT record array.
+    radius    (int)           See `resourceaccess`.
+    tolerance (int)           See `unitsymmetry`.
+
+  Returns:
+    (dict) Containing `tiles` and `units` symmetry scores, per-player resource `access` and
+    `fairness` scores.
+  """
+
+  height, width = numpy.shape(tiles)
+  access = resourceaccess(units, radius)
+
+  return dict(tiles    = tilesymmetry(tiles),
+              units    = unitsymmetry(units, width, height, tolerance),
+              access   = access,
+              fairness = fairness(access))
+
+#---------------------------------------------------------------------------------------------------
+
+def _asrecords(units):
+  """
+  Turns `Unit` instances into a UNIT record array.
+  """
+
+  if isinstance(units, numpy.ndarray):
+    return units
+
+  return numpy.array([(u.x, u.y, u.type, u.owner, u.resource) for u in units],
+                     dtype=diff.UNIT_DTYPE)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+#
+#  This file is part of war2pud.
+#
+#  Copyright (c) 2012 Beau Hastings. All rights reserved.
+#  License: GNU GPL version 2, see LICENSE for more details.
+#
+#  Author: Beau Hastings <beausy@gmail.com>
+
+# Standard Python imports.
+import os
+
+# Application imports.
+import render
+
+# 3rd party imports.
+import Image
+import numpy
+
+class TileClass(object):
+  """
+  Terrain classes of MTXM tile codes. Solid classes match the class nibble of a solid tile code,
+  boundary classes are 0x10 plus the high byte of a boundary tile code.
+  """
+  UNKNOWN          = 0x00
+  LIGHT_WATER      = 0x01
+  DARK_WATER       = 0x02
+  LIGHT_COAST      = 0x03
+  DARK_COAST       = 0x04
+  LIGHT_GROUND     = 0x05
+  DARK_GROUND      = 0x06
+  FOREST           = 0x07
+  MOUNTAINS        = 0x08
+  HUMAN_WALL       = 0x09
+  ORC_WALL         = 0x0a
+  DARK_WATER_WATER = 0x11
+  WATER_COAST      = 0x12
+  DARK_COAST_COAST = 0x13
+  MOUNT_COAST      = 0x14
+  COAST_GRASS      = 0x15
+  DARK_GRASS_GRASS = 0x16
+  FOREST_GRASS     = 0x17
+
+#---------------------------------------------------------------------------------------------------
+
+"""
+(dict) Tileset image of each terrain.
+"""
+TILEMAPS = {
+  'forest':    'FOREST.BMP',
+  'winter':    'WINTER.BMP',
+  'wasteland': 'WASTE.BMP',
+  'swamp':     'SWAMP.BMP',
+}
+
+"""
+(int) Atlas tile used for codes that are not in the PUD spec.
+"""
+DEFAULT_ATLAS_INDEX = 135
+
+"""
+(int) Number of variants of each tile group in the atlases.
+"""
+ATLAS_VARIANTS = 15
+
+"""
+(dict) Class and first atlas tile of each solid tile class nibble (tile codes 0x00X0 - 0x00XF).
+"""
+_SOLID = {
+  0x1: (TileClass.LIGHT_WATER,  135),
+  0x2: (TileClass.DARK_WATER,   135),
+  0x3: (TileClass.LIGHT_COAST,  105),
+  0x4: (TileClass.DARK_COAST,   105),
+  0x5: (TileClass.LIGHT_GROUND, 120),
+  0x6: (TileClass.DARK_GROUND,  120),
+  0x7: (TileClass.FOREST,       150),
+  0x8: (TileClass.MOUNTAINS,    195),
+  0x9: (TileClass.HUMAN_WALL,   211),
+  0xa: (TileClass.ORC_WALL,     227),
+  0xb: (TileClass.HUMAN_WALL,   211),
+  0xc: (TileClass.ORC_WALL,     227),
+}
+
+"""
+(dict) Class and first atlas tile of each boundary tile group, by the high byte of the tile code.
+"""
+_BOUNDARY = {
+  0x01: (TileClass.DARK_WATER_WATER, 135),
+  0x02: (TileClass.WATER_COAST,      180),
+  0x03: (TileClass.DARK_COAST_COAST, 105),
+  0x04: (TileClass.MOUNT_COAST,      195),
+  0x05: (TileClass.COAST_GRASS,      165),
+  0x06: (TileClass.DARK_GRASS_GRASS, 120),
+  0x07: (TileClass.FOREST_GRASS,     150),
+  0x08: (TileClass.HUMAN_WALL,       211),
+  0x09: (TileClass.ORC_WALL,         227),
+  0x0a: (TileClass.HUMAN_WALL,       211),
+  0x0b: (TileClass.ORC_WALL,         227),
+}
+
+"""
+(tuple) Class and atlas index lookup tables shared by all terrains, built on first use.
+"""
+_tables = None
+
+"""
+(dict) Loaded tilesets by terrain and data directory.
+"""
+_tilesets = {}
+
+#---------------------------------------------------------------------------------------------------
+
+class Tileset(object):
+  """
+  Lookup tables that map each of the 65,536 MTXM tile codes of a terrain to its class, atlas tile
+  and mean colour, so that a whole map is classified with a single `take`.
+  """
+
+  """
+  (str) Terrain name.
+  """
+  terrain = ''
+
+  """
+  (numpy.ndarray) RGB pixels of the atlas tiles, of shape (tiles, TILE_HEIGHT, TILE_WIDTH, 3).
+  """
+  tiles = None
+
+  """
+  (numpy.ndarray) `TileClass` of each tile code.
+  """
+  classes = None
+
+  """
+  (numpy.ndarray) Atlas tile of each tile code.
+  """
+  atlas = None
+
+  """
+  (numpy.ndarray) Mean RGB colour of each tile code, of shape (65536, 3).
+  """
+  colours = None
+
+  def __init__(self, terrain, datadir=None):
+    """
+    Create a new `Tileset` instance. Use `load` to share tilesets between maps.
+
+    Args:
+      terrain (str) Terrain name. Unknown terrains use the forest tileset.
+      datadir (str) Path to data directory. (default: current_directory/data)
+    """
+
+    if datadir is None:
+      basedir = os.path.abspath(os.path.dirname(__file__))
+      datadir = os.path.join(basedir, '..', 'data')
+
+    self.terrain = terrain
+    self.tiles = render.loadatlas(Image.open(os.path.join(datadir,
+                                                          TILEMAPS.get(terrain, 'FOREST.BMP'))))
+    self.classes, self.atlas = _compile()
+
+    tilecolours  = self.tiles.mean(axis=(1, 2)).round().astype(numpy.uint8)
+    self.colours = tilecolours.take(self.atlas, axis=0)
+
+  def __repr__(self):
+    return '<%s(%r)>' % (self.__class__.__name__, self.terrain)
+
+  #-------------------------------------------------------------------------------------------------
+
+  def classify(self, tiles):
+    """
+    Looks up the terrain class of tiles.
+
+    Args:
+      tiles (numpy.ndarray) MTXM tile codes.
+
+    Returns:
+      (numpy.ndarray) `TileClass` of each tile.
+    """
+
+    return self.classes.take(tiles)
+
+  #-------------------------------------------------------------------------------------------------
+
+  def atlasindices(self, tiles):
+    """
+    Looks up the atlas tile of tiles.
+
+    Args:
+      tiles (numpy.ndarray) MTXM tile codes.
+
+    Returns:
+      (numpy.ndarray) Atlas tile of each tile.
+    """
+
+    return self.atlas.take(tiles)
+
+  #-------------------------------------------------------------------------------------------------
+
+  def minimap(self, tiles):
+    """
+    Looks up the mean colour of tiles, one pixel per tile.
+
+    Args:
+      tiles (numpy.ndarray) MTXM tile codes, of shape (height, width).
+
+    Returns:
+      (numpy.ndarray) Mean RGB colour of each tile, of shape (height, width, 3).
+    """
+
+    return self.colours.take(tiles, axis=0)
+
+#---------------------------------------------------------------------------------------------------
+
+def load(terrain, datadir=None):
+  """
+  Loads the tileset of a terrain, reusing it if it was loaded before.
+
+  Args:
+    terrain (str) Terrain name.
+    datadir (str) Path to data directory. (default: current_directory/data)
+
+  Returns:
+    (Tileset) The tileset.
+  """
+
+  key = (terrain, datadir)
+  if not key in _tilesets:
+    _tilesets[key] = Tileset(terrain, datadir)
+  return _tilesets[key]
+
+#---------------------------------------------------------------------------------------------------
+
+def _compile():
+  """
+  Builds the class and atlas index lookup tables from the PUD spec tile code layout.
+
+  Solid tiles are 0x00CV, with class nibble C and variant V. Boundary tiles are 0xGGSV, with
+  group GG, boundary shape S and variant V; the shape picks the atlas variant.
+
+  Returns:
+    (tuple) Containing the (numpy.ndarray) class and atlas index of each tile code.
+  """
+
+  global _tables
+
+  if _tables is None:
+    codes  = numpy.arange(0x10000)
+    group  = codes >> 8
+    nibble = (codes >> 4) & 0xf
+    solid  = group == 0
+
+    classes = numpy.zeros(0x10000, dtype=numpy.uint8)
+    atlas   = numpy.full(0x10000, DEFAULT_ATLAS_INDEX, dtype=numpy.uint16)
+
+    for key, (tileclass, first) in _SOLID.items():
+      mask = solid & (nibble == key)
+      classes[mask] = tileclass
+      atlas[mask]   = first + (codes[mask] & 0xf) % ATLAS_VARIANTS
+
+    for key, (tileclass, first) in _BOUNDARY.items():
+      mask = group == key
+      classes[mask] = tileclass
+      atlas[mask]   = first + nibble[mask] % ATLAS_VARIANTS
+
+    classes.flags.writeable = False
+    atlas.flags.writeable   = False
+    _tables = classes, atlas
+
+  return _tables